@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
-from functools import lru_cache
+from functools import cache
 from utils.crypto_utils import decrypt
 
 
@@ -19,6 +19,9 @@ class Settings(BaseSettings):
     email_expense: str = ""           # 费用报销
     email_payment_sweden_shic: str = ""  # 付款-瑞典对公-SHIC
 
+    # Logging level; set to DEBUG to dump full webhook bodies
+    log_level: str = "INFO"
+
     # Auto-decrypt encrypted values (starting with "ENC:")
     @field_validator("feishu_app_secret", mode="before")
     @classmethod
@@ -32,6 +35,6 @@ class Settings(BaseSettings):
         env_file_encoding = "utf-8"
 
 
-@lru_cache
+@cache
 def get_settings() -> Settings:
     return Settings()
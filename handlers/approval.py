@@ -1,15 +1,32 @@
-from typing import Any, Optional
+import html
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Optional
+
+import orjson
+
 from config import Settings
 from services import FeishuClient, AttachmentService, EmailSender
 
+# Flatten newlines in email subjects: "\n" -> " ", drop "\r"
+_SUBJECT_TRANS = str.maketrans({"\n": " ", "\r": None})
+
+
+@dataclass
+class _FormState:
+    """Values collected while scanning the approval form."""
+    title: str = ""
+    amount: str = ""
+    expense_contents: list[str] = field(default_factory=list)  # For 费用报销: collect all 报销内容
+
 
 class ApprovalHandler:
     # Mapping: approval_name (Chinese) -> settings attribute name (English)
-    # Add new approval types here
-    APPROVAL_EMAIL_ATTRS = {
+    # Add new approval types here (read-only at runtime)
+    APPROVAL_EMAIL_ATTRS = MappingProxyType({
         "费用报销": "email_expense",
         "付款-瑞典对公-SHIC": "email_payment_sweden_shic",
-    }
+    })
 
     def __init__(self, settings: Settings):
         self.settings = settings
@@ -23,19 +40,83 @@ class ApprovalHandler:
             from_email=settings.resend_from_email,
         )
 
+        # Settings are immutable after init: resolve approval_name -> email once
+        self._email_for: dict[str, Optional[str]] = {
+            name: (getattr(settings, attr, "") or None)
+            for name, attr in self.APPROVAL_EMAIL_ATTRS.items()
+        }
+
+        # Form field handlers keyed by (field_name, field_type)
+        self._field_dispatch: dict[tuple[str, str], Callable[[dict, _FormState], None]] = {
+            # Title from "名称" field (付款test) or "付款事由" field (付款-瑞典对公-SHIC)
+            ("名称", "input"): self._set_title,
+            ("名称", "textarea"): self._set_title,
+            ("付款事由", "input"): self._set_title,
+            ("付款事由", "textarea"): self._set_title,
+            # Amount from "金额" or "付款金额" field
+            ("金额", "amount"): self._set_amount,
+            ("付款金额", "amount"): self._set_amount,
+        }
+        # Fallback handlers keyed by field_type only (field name varies)
+        self._type_dispatch: dict[str, Callable[[dict, _FormState], None]] = {
+            "fieldList": self._collect_field_list,
+        }
+
+    async def aclose(self) -> None:
+        """Release network resources held by the handler's services."""
+        await self.email_sender.aclose()
+
     def _get_target_email(self, approval_name: str) -> Optional[str]:
         """Get target email based on approval name from settings."""
-        attr_name = self.APPROVAL_EMAIL_ATTRS.get(approval_name)
-        if not attr_name:
-            return None
-        email = getattr(self.settings, attr_name, "")
-        return email if email else None
-
-    async def handle_event(self, event: dict[str, Any]) -> bool:
-        """Handle approval status changed event.
-
-        Only processes APPROVED status events from approval_instance event type.
-        Returns True if email was sent successfully, False otherwise.
+        return self._email_for.get(approval_name)
+
+    @staticmethod
+    def _set_title(form_field: dict, state: _FormState) -> None:
+        if not state.title:  # Don't overwrite if already set
+            state.title = form_field.get("value", "").strip()
+
+    @staticmethod
+    def _set_amount(form_field: dict, state: _FormState) -> None:
+        amount_value = form_field.get("value", "")
+        ext = form_field.get("ext", {})
+        currency = ext.get("currency", "SEK") if isinstance(ext, dict) else "SEK"
+        state.amount = f"{amount_value} {currency}"
+
+    @staticmethod
+    def _collect_field_list(form_field: dict, state: _FormState) -> None:
+        """Handle fieldList (费用报销): extract 报销内容 and total amount."""
+        # Get total amount from ext
+        if not state.amount:
+            ext = form_field.get("ext", [])
+            if isinstance(ext, list):
+                for item in ext:
+                    if item.get("type") == "amount":
+                        sum_items = item.get("sumItems", "")
+                        if sum_items:
+                            try:
+                                sums = orjson.loads(sum_items)
+                                parts = [f"{s.get('value', '')} {s.get('currency', '')}" for s in sums]
+                                state.amount = ", ".join(parts)
+                            except orjson.JSONDecodeError:
+                                state.amount = item.get("value", "")
+                        break
+
+        # Get 报销内容 from each row
+        rows = form_field.get("value", [])
+        if isinstance(rows, list):
+            for row in rows:
+                if isinstance(row, list):
+                    for cell in row:
+                        if cell.get("name") == "报销内容" and cell.get("type") == "input":
+                            content = cell.get("value", "").strip()
+                            if content:
+                                state.expense_contents.append(content)
+
+    @staticmethod
+    def should_process(event: dict[str, Any]) -> bool:
+        """Return True for APPROVED events of the approval_instance event type.
+
+        Cheap enough to call in the webhook before scheduling any work.
         """
         # Check event type - only process approval_instance events
         header = event.get("header", {})
@@ -57,6 +138,19 @@ class ApprovalHandler:
             print(f"Skipping event with status: {status}")
             return False
 
+        return True
+
+    async def handle_event(self, event: dict[str, Any]) -> bool:
+        """Handle approval status changed event.
+
+        Only processes APPROVED status events from approval_instance event type.
+        Returns True if email was sent successfully, False otherwise.
+        """
+        if not self.should_process(event):
+            return False
+
+        event_data = event.get("event", {})
+
         # Get instance code
         instance_code = (
             event_data.get("instance_code")
@@ -80,8 +174,6 @@ class ApprovalHandler:
 
         Returns True if email was sent successfully, False otherwise.
         """
-        import json
-
         # 1. Get approval instance details
         print(f"Fetching approval instance details for {instance_code}...")
         instance = await self.feishu_client.get_approval_instance(instance_code)
@@ -98,55 +190,18 @@ class ApprovalHandler:
         print(f"Approval type: {approval_name} -> {target_email}")
 
         # 3. Get approval title and amount from form
-        form_data = json.loads(form_json)
-        approval_title = ""
-        approval_amount = ""
-        expense_contents = []  # For 费用报销: collect all 报销内容
-
-        for field in form_data:
-            field_name = field.get("name", "")
-            field_type = field.get("type", "")
-
-            # Get title from "名称" field (付款test) or "付款事由" field (付款-瑞典对公-SHIC)
-            if field_name in ("名称", "付款事由") and field_type in ("input", "textarea"):
-                if not approval_title:  # Don't overwrite if already set
-                    approval_title = field.get("value", "").strip()
-
-            # Get amount from "金额" or "付款金额" field
-            elif field_name in ("金额", "付款金额") and field_type == "amount":
-                amount_value = field.get("value", "")
-                ext = field.get("ext", {})
-                currency = ext.get("currency", "SEK") if isinstance(ext, dict) else "SEK"
-                approval_amount = f"{amount_value} {currency}"
-
-            # Handle fieldList (费用报销): extract 报销内容 and total amount
-            elif field_type == "fieldList":
-                # Get total amount from ext
-                if not approval_amount:
-                    ext = field.get("ext", [])
-                    if isinstance(ext, list):
-                        for item in ext:
-                            if item.get("type") == "amount":
-                                sum_items = item.get("sumItems", "")
-                                if sum_items:
-                                    try:
-                                        sums = json.loads(sum_items)
-                                        parts = [f"{s.get('value', '')} {s.get('currency', '')}" for s in sums]
-                                        approval_amount = ", ".join(parts)
-                                    except json.JSONDecodeError:
-                                        approval_amount = item.get("value", "")
-                                break
-
-                # Get 报销内容 from each row
-                rows = field.get("value", [])
-                if isinstance(rows, list):
-                    for row in rows:
-                        if isinstance(row, list):
-                            for cell in row:
-                                if cell.get("name") == "报销内容" and cell.get("type") == "input":
-                                    content = cell.get("value", "").strip()
-                                    if content:
-                                        expense_contents.append(content)
+        form_data = orjson.loads(form_json)
+        state = _FormState()
+
+        for form_field in form_data:
+            key = (form_field.get("name", ""), form_field.get("type", ""))
+            handler = self._field_dispatch.get(key) or self._type_dispatch.get(key[1])
+            if handler:
+                handler(form_field, state)
+
+        approval_title = state.title
+        approval_amount = state.amount
+        expense_contents = state.expense_contents
 
         # For 费用报销: use expense contents joined by "-" as title
         if expense_contents:
@@ -155,7 +210,7 @@ class ApprovalHandler:
             approval_title = instance.get("serial_number", instance_code)
 
         # 4. Extract attachments from form
-        attachments = self.attachment_service.extract_attachments_from_form(form_json)
+        attachments = self.attachment_service.extract_attachments_from_parsed(form_data)
         if not attachments:
             print(f"No attachments found for instance {instance_code}")
             return False
@@ -169,20 +224,27 @@ class ApprovalHandler:
             return False
 
         # 6. Send email with format: [审批种类]-审批标题
-        subject = f"[{approval_name}]-{approval_title.replace(chr(10), ' ').replace(chr(13), '')}"
-        body = (
-            f"审批已通过\n\n"
-            f"审批类型: {approval_name}\n"
-            f"审批标题: {approval_title}\n"
-            f"审批金额: {approval_amount}\n"
-            f"附件数量: {len(downloaded)}\n"
-        )
+        subject = f"[{approval_name}]-{approval_title.translate(_SUBJECT_TRANS)}"
+        body_lines = [
+            "审批已通过",
+            "",
+            f"审批类型: {approval_name}",
+            f"审批标题: {approval_title}",
+            f"审批金额: {approval_amount}",
+            f"附件数量: {len(downloaded)}",
+            "",
+        ]
+        body = "\n".join(body_lines)
+        # Escape user-controlled values (e.g. the title) for the HTML part
+        html_lines = "<br>".join(html.escape(line).replace("\n", "<br>") for line in body_lines)
+        html_body = f"<html><body><p>{html_lines}</p></body></html>"
 
         print(f"Sending email to {target_email} with {len(downloaded)} attachments...")
         await self.email_sender.send_with_attachments(
             to_email=target_email,
             subject=subject,
             body=body,
+            html_body=html_body,
             attachments=downloaded,
         )
         print(f"Email sent successfully to {target_email}")
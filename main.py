@@ -1,7 +1,11 @@
-import json
 import hmac
 import hashlib
-from typing import Any, Dict, Set
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+import orjson
 
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
 from fastapi.responses import JSONResponse
@@ -9,15 +13,36 @@ from fastapi.responses import JSONResponse
 from config import get_settings
 from handlers import ApprovalHandler
 
-APP = FastAPI()
+logger = logging.getLogger(__name__)
 
 # Event deduplication - in production, use Redis or database
-_processed_events: Set[str] = set()
-_processed_instances: Set[str] = set()  # Additional dedup by instance_code
+# Single OrderedDict used as an LRU (oldest entries evicted first), with
+# namespaced keys: ("evt", event_id) and ("inst", instance_code)
+_dedup: OrderedDict[tuple[str, str], None] = OrderedDict()
 _MAX_PROCESSED_EVENTS = 10000
 
+# Feishu event callbacks are small; reject anything larger before reading/parsing it
+_MAX_BODY_BYTES = 1024 * 1024
+
 settings = get_settings()
-approval_handler = ApprovalHandler(settings)
+logging.basicConfig(level=settings.log_level.upper())
+
+# Signing key is fixed for the process lifetime: key the HMAC once and copy it per request
+_SIGNING_KEY = settings.feishu_signing_secret.encode("utf-8") if settings.feishu_signing_secret else None
+_HMAC_TEMPLATE = hmac.new(_SIGNING_KEY, b"", hashlib.sha256) if _SIGNING_KEY else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the approval handler once the event loop is running, and close it on shutdown."""
+    app.state.handler = ApprovalHandler(settings)
+    try:
+        yield
+    finally:
+        await app.state.handler.aclose()
+
+
+APP = FastAPI(lifespan=lifespan)
 
 
 def verify_token(body: Dict[str, Any]) -> None:
@@ -30,7 +55,7 @@ def verify_signature(request: Request, raw_body: bytes) -> None:
     """
     Verify Feishu event signature if signing secret is configured.
     """
-    if not settings.feishu_signing_secret:
+    if _HMAC_TEMPLATE is None:
         return
 
     timestamp = request.headers.get("X-Lark-Request-Timestamp") or ""
@@ -40,14 +65,14 @@ def verify_signature(request: Request, raw_body: bytes) -> None:
     if not (timestamp and nonce and signature):
         raise HTTPException(status_code=400, detail="missing signature headers")
 
-    base = f"{timestamp}\n{nonce}\n{raw_body.decode('utf-8')}\n".encode("utf-8")
-    digest = hmac.new(
-        settings.feishu_signing_secret.encode("utf-8"),
-        base,
-        hashlib.sha256,
-    ).hexdigest()
+    base = b"%s\n%s\n%s\n" % (timestamp.encode("utf-8"), nonce.encode("utf-8"), raw_body)
+    mac = _HMAC_TEMPLATE.copy()
+    mac.update(base)
+    digest = mac.hexdigest()
 
-    if not signature.endswith(digest):
+    # Compare bytes: str compare_digest raises TypeError on non-ASCII input.
+    # Starlette decodes headers as latin-1, so this round-trips the raw header bytes.
+    if not hmac.compare_digest(signature[-64:].encode("latin-1"), digest.encode("ascii")):
         raise HTTPException(status_code=403, detail="invalid signature")
 
 
@@ -74,39 +99,31 @@ def get_event_id(body: Dict[str, Any]) -> str:
     return f"{instance_code}:{status}"
 
 
-def is_duplicate_event(event_id: str) -> bool:
-    """Check if event was already processed."""
-    global _processed_events
-
-    if event_id in _processed_events:
+def _touch(key: tuple[str, str]) -> bool:
+    """Mark key as seen. Returns True if it was already present."""
+    if key in _dedup:
+        _dedup.move_to_end(key)
         return True
 
-    # Simple cleanup when set gets too large
-    if len(_processed_events) >= _MAX_PROCESSED_EVENTS:
-        _processed_events = set(list(_processed_events)[-5000:])
-
-    _processed_events.add(event_id)
+    _dedup[key] = None
+    if len(_dedup) > _MAX_PROCESSED_EVENTS:
+        _dedup.popitem(last=False)
     return False
 
 
+def is_duplicate_event(event_id: str) -> bool:
+    """Check if event was already processed."""
+    return _touch(("evt", event_id))
+
+
 def check_and_mark_instance(instance_code: str) -> bool:
     """Check if instance was already processed, and mark it if not.
 
     Returns True if this is a new instance (not processed before).
     Returns False if already processed (duplicate).
     """
-    global _processed_instances
-
-    if instance_code in _processed_instances:
-        return False  # Already processed
-
-    # Simple cleanup when set gets too large
-    if len(_processed_instances) >= _MAX_PROCESSED_EVENTS:
-        _processed_instances = set(list(_processed_instances)[-5000:])
-
-    # Mark immediately to prevent concurrent processing
-    _processed_instances.add(instance_code)
-    return True  # New instance, now marked
+    # Marked immediately to prevent concurrent processing
+    return not _touch(("inst", instance_code))
 
 
 def get_instance_code(body: Dict[str, Any]) -> str:
@@ -119,32 +136,39 @@ def get_instance_code(body: Dict[str, Any]) -> str:
     )
 
 
-async def process_approval_event(body: Dict[str, Any]) -> None:
-    """Background task to process approval event."""
+async def process_approval_event(handler: ApprovalHandler, body: Dict[str, Any]) -> None:
+    """Background task to process an APPROVED approval event."""
     import traceback
     instance_code = get_instance_code(body)
 
-    # Check status first - only do instance dedup for APPROVED events
-    event_data = body.get("event", {})
-    status = (
-        event_data.get("status")
-        or event_data.get("instance_status")
-        or event_data.get("object", {}).get("status")
-    )
-
-    # For APPROVED events, check and mark instance to prevent concurrent processing
-    if status == "APPROVED" and instance_code:
+    # Check and mark instance to prevent concurrent processing
+    if instance_code:
         if not check_and_mark_instance(instance_code):
             print(f"Instance {instance_code} already being processed, skipping")
             return
 
     try:
-        await approval_handler.handle_event(body)
+        await handler.handle_event(body)
     except Exception as e:
         print(f"Error processing approval event: {e}")
         traceback.print_exc()
 
 
+async def read_limited_body(request: Request) -> bytes:
+    """Read the request body, aborting once it exceeds _MAX_BODY_BYTES.
+
+    Covers chunked requests that carry no Content-Length header.
+    """
+    chunks = []
+    total = 0
+    async for chunk in request.stream():
+        total += len(chunk)
+        if total > _MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="payload too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
 @APP.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -153,15 +177,20 @@ async def health_check():
 
 @APP.post("/feishu/webhook/approval")
 async def feishu_webhook(request: Request, background_tasks: BackgroundTasks):
-    raw_body = await request.body()
-    try:
-        body = json.loads(raw_body.decode("utf-8"))
-    except Exception:
-        raise HTTPException(status_code=400, detail="invalid json")
+    content_length = request.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > _MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="payload too large")
+
+    raw_body = await read_limited_body(request)
 
-    # 1) Verify signature if enabled
+    # 1) Verify signature if enabled (on raw bytes, before any parsing)
     verify_signature(request, raw_body)
 
+    try:
+        body = orjson.loads(raw_body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="invalid json")
+
     # 2) Token verification
     verify_token(body)
 
@@ -169,19 +198,28 @@ async def feishu_webhook(request: Request, background_tasks: BackgroundTasks):
     if body.get("type") == "url_verification" and "challenge" in body:
         return JSONResponse({"challenge": body["challenge"]})
 
-    # Debug: print full event body
-    print(f"=== Received webhook ===")
-    print(f"Body: {json.dumps(body, ensure_ascii=False, indent=2)}")
+    print("=== Received webhook ===")
+
+    # Debug: log full event body (skip serialization unless DEBUG is enabled)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Received webhook: %s",
+            orjson.dumps(body, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode(),
+        )
+
+    # 4) Drop events we would skip anyway, before any dedup/task scheduling
+    if not ApprovalHandler.should_process(body):
+        return JSONResponse({"ok": True})
 
-    # 4) Deduplication check - by event_id
+    # 5) Deduplication check - by event_id
     event_id = get_event_id(body)
     if is_duplicate_event(event_id):
         print(f"Duplicate event {event_id}, skipping")
         return JSONResponse({"ok": True})
 
-    # 5) Process event in background (instance dedup happens there for APPROVED events)
+    # 6) Process event in background (instance dedup happens there)
     instance_code = get_instance_code(body)
     print(f"Processing event: {event_id}, instance: {instance_code}")
-    background_tasks.add_task(process_approval_event, body)
+    background_tasks.add_task(process_approval_event, request.app.state.handler, body)
 
     return JSONResponse({"ok": True})
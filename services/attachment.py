@@ -10,7 +10,7 @@ class AttachmentInfo:
     file_token: str
     name: str
     mime_type: str = ""
-    content: Optional[bytes] = None
+    content_b64: Optional[str] = None  # Base64-encoded file content
     download_url: str = ""
 
 
@@ -26,13 +26,22 @@ class AttachmentService:
 
         This also handles nested attachments inside fieldList (费用明细) controls.
         """
-        attachments = []
         try:
             form_data = json.loads(form_json)
         except json.JSONDecodeError:
-            return attachments
+            return []
+
+        return self.extract_attachments_from_parsed(form_data)
 
-        self._extract_attachments_recursive(form_data, attachments)
+    def extract_attachments_from_parsed(self, form_data: list) -> list[AttachmentInfo]:
+        """Extract attachment info from an already-parsed approval form.
+
+        Same as extract_attachments_from_form, for callers that have decoded
+        the form JSON themselves.
+        """
+        attachments = []
+        if isinstance(form_data, list):
+            self._extract_attachments_recursive(form_data, attachments)
         return attachments
 
     def _extract_attachments_recursive(self, controls: list, attachments: list[AttachmentInfo]):
@@ -166,7 +175,7 @@ class AttachmentService:
         self,
         attachments: list[AttachmentInfo],
     ) -> list[AttachmentInfo]:
-        """Download all attachments and populate their content."""
+        """Download all attachments and populate their base64 content."""
         if not attachments:
             return []
 
@@ -184,8 +193,7 @@ class AttachmentService:
                 print(f"No download URL for {attachment.name}")
                 continue
             try:
-                content = await self.client.download_file(url)
-                attachment.content = content
+                attachment.content_b64 = await self.client.download_file_b64(url)
                 downloaded.append(attachment)
             except Exception as e:
                 print(f"Failed to download {attachment.name}: {e}")
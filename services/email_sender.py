@@ -1,17 +1,24 @@
-import base64
-import resend
+import httpx
 
 from .attachment import AttachmentInfo
 
 
 class EmailSender:
+    API_URL = "https://api.resend.com/emails"
+
     def __init__(
         self,
         api_key: str,
         from_email: str,
     ):
         self.from_email = from_email
-        resend.api_key = api_key
+        self.api_key = api_key
+        # Shared client so bursts of emails reuse one HTTP/2 connection to Resend
+        self._client = httpx.AsyncClient(timeout=30, http2=True)
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client."""
+        await self._client.aclose()
 
     async def send_with_attachments(
         self,
@@ -19,16 +26,20 @@ class EmailSender:
         subject: str,
         body: str,
         attachments: list[AttachmentInfo],
+        html_body: str,
     ) -> None:
-        """Send email with attachments via Resend API."""
+        """Send email with attachments via Resend API.
+
+        html_body is the complete HTML document sent alongside the plain-text body.
+        """
         # Prepare attachments for Resend
         resend_attachments = []
         for attachment in attachments:
-            if attachment.content is None:
+            if attachment.content_b64 is None:
                 continue
             resend_attachments.append({
                 "filename": attachment.name,
-                "content": list(attachment.content),  # Resend expects list of bytes
+                "content": attachment.content_b64,  # Already base64-encoded by the downloader
                 "content_type": "application/octet-stream",  # Force as attachment, not inline
                 "headers": {
                     "Content-Disposition": f'attachment; filename="{attachment.name}"',
@@ -37,15 +48,19 @@ class EmailSender:
 
         # Send email via Resend
         # Use HTML format to prevent email clients from auto-inlining images
-        html_body = body.replace("\n", "<br>")
         params = {
             "from": self.from_email,
             "to": [to_email],
             "subject": subject,
             "text": body,
-            "html": f"<html><body><p>{html_body}</p></body></html>",
+            "html": html_body,
         }
         if resend_attachments:
             params["attachments"] = resend_attachments
 
-        resend.Emails.send(params)
+        resp = await self._client.post(
+            self.API_URL,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json=params,
+        )
+        resp.raise_for_status()
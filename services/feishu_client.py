@@ -1,3 +1,4 @@
+import base64
 import time
 import httpx
 from typing import Optional
@@ -88,9 +89,24 @@ class FeishuClient:
             for item in result.get("data", {}).get("tmp_download_urls", [])
         }
 
-    async def download_file(self, url: str) -> bytes:
-        """Download file content from URL."""
+    async def download_file_b64(self, url: str, chunk_size: int = 65536) -> str:
+        """Download file content from URL as a base64 string.
+
+        The response is streamed and encoded chunk by chunk, so the raw file
+        bytes are never held in memory in full. The final join briefly holds
+        two copies of the base64 text (~2.7x the file size).
+        """
+        parts = []
+        carry = b""
         async with httpx.AsyncClient() as client:
-            resp = await client.get(url, follow_redirects=True)
-            resp.raise_for_status()
-            return resp.content
+            async with client.stream("GET", url, follow_redirects=True) as resp:
+                resp.raise_for_status()
+                async for chunk in resp.aiter_bytes(chunk_size):
+                    data = carry + chunk
+                    # Only encode whole 3-byte groups so no padding appears mid-stream
+                    cut = len(data) - len(data) % 3
+                    parts.append(base64.b64encode(data[:cut]).decode("ascii"))
+                    carry = data[cut:]
+        if carry:
+            parts.append(base64.b64encode(carry).decode("ascii"))
+        return "".join(parts)
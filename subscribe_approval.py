@@ -5,30 +5,21 @@ from config import get_settings
 from services.feishu_client import FeishuClient
 
 
-async def subscribe(approval_code: str):
+async def subscribe(client: httpx.AsyncClient, approval_code: str, token: str):
     """Subscribe to approval events."""
-    settings = get_settings()
-    client = FeishuClient(
-        app_id=settings.feishu_app_id,
-        app_secret=settings.feishu_app_secret,
+    resp = await client.post(
+        "https://open.feishu.cn/open-apis/approval/openapi/v1/subscription/subscribe",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"definition_code": approval_code},
     )
+    data = resp.json()
 
-    token = await client._get_tenant_access_token()
+    if data.get("code") == 0:
+        print(f"✓ Subscribed to {approval_code}")
+    else:
+        print(f"✗ Failed to subscribe {approval_code}: {data}")
 
-    async with httpx.AsyncClient() as http:
-        resp = await http.post(
-            "https://open.feishu.cn/open-apis/approval/openapi/v1/subscription/subscribe",
-            headers={"Authorization": f"Bearer {token}"},
-            json={"definition_code": approval_code},
-        )
-        data = resp.json()
-
-        if data.get("code") == 0:
-            print(f"✓ Subscribed to {approval_code}")
-        else:
-            print(f"✗ Failed to subscribe {approval_code}: {data}")
-
-        return data
+    return data
 
 
 async def main():
@@ -39,9 +30,24 @@ async def main():
         # Add more approval codes as needed
     ]
 
+    settings = get_settings()
+    feishu_client = FeishuClient(
+        app_id=settings.feishu_app_id,
+        app_secret=settings.feishu_app_secret,
+    )
+    token = await feishu_client._get_tenant_access_token()
+
     print("Subscribing to approval events...\n")
-    for code in approval_codes:
-        await subscribe(code)
+    # One connection (and token) shared by all subscriptions
+    async with httpx.AsyncClient(http2=True) as client:
+        results = await asyncio.gather(
+            *(subscribe(client, code, token) for code in approval_codes),
+            return_exceptions=True,
+        )
+
+    for code, result in zip(approval_codes, results):
+        if isinstance(result, Exception):
+            print(f"✗ Failed to subscribe {code}: {result!r}")
 
 
 if __name__ == "__main__":
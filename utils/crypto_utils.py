@@ -2,6 +2,7 @@
 import base64
 import os
 import hashlib
+from functools import lru_cache
 from typing import Optional
 
 # Use a machine-specific key (or set ENCRYPTION_KEY env var)
@@ -28,7 +29,12 @@ def decrypt(ciphertext: str) -> str:
     if not ciphertext.startswith("ENC:"):
         return ciphertext  # Not encrypted, return as-is
 
-    key = _get_key()
+    return _decrypt(ciphertext, _get_key())
+
+
+@lru_cache(maxsize=32)
+def _decrypt(ciphertext: str, key: bytes) -> str:
+    """Decrypt with an explicit key; cached per (ciphertext, key) pair."""
     encrypted = base64.b64decode(ciphertext[4:])
     decrypted = bytes(a ^ b for a, b in zip(encrypted, key * (len(encrypted) // len(key) + 1)))
     return decrypted.decode()